@@ -0,0 +1,66 @@
+"""
+Measure API worker cold start: time to import the app and run its startup
+hooks, plus the number of SQL statements issued, in fresh interpreters.
+
+    DATABASE_URL=... python bench_startup.py [--runs 10] [--create-all]
+
+--create-all also times the old import-time Base.metadata.create_all() for comparison.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+_CHILD = r"""
+import json, time
+from fastapi.testclient import TestClient  # harness only, not timed
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+import metrics
+with TestClient(main.app):
+    pass
+t2 = time.perf_counter()
+statements = sum(sum(row[:-1]) for row in metrics.db_statement_duration._values.values())
+if {create_all}:
+    from db import Base, engine
+    Base.metadata.create_all(bind=engine)
+t3 = time.perf_counter()
+print(json.dumps({{"import": t1 - t0, "startup": t2 - t1, "create_all": t3 - t2, "statements": int(statements)}}))
+"""
+
+
+def _run_once(create_all: bool) -> dict:
+    here = os.path.dirname(os.path.abspath(__file__))
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD.format(create_all=create_all)],
+        cwd=here,
+        env=os.environ.copy(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark API worker startup time.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--create-all", action="store_true", help="Also time Base.metadata.create_all()")
+    args = parser.parse_args(argv)
+
+    samples = [_run_once(args.create_all) for _ in range(args.runs)]
+    for key in ("import", "startup", "create_all"):
+        if key == "create_all" and not args.create_all:
+            continue
+        values = [s[key] * 1000 for s in samples]
+        print(f"{key:>10}: median {statistics.median(values):8.1f} ms   max {max(values):8.1f} ms")
+    print(f"statements at startup: {samples[0]['statements']}")
+
+
+if __name__ == "__main__":
+    main()
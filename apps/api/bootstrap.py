@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import argparse
+import logging
+from typing import Callable
+
+from sqlalchemy import func, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+import rollups
+from db import Base, engine, read_engine
+from models import OwnerDailyStats, SchemaVersion, SuiteDailyStats, TestCase, TestExecution
+
+# Bump together with a MIGRATIONS entry whenever the models change.
+SCHEMA_VERSION = 3
+
+
+def _add_daily_rollups(conn: Connection) -> None:
+    Base.metadata.create_all(bind=conn, tables=[SuiteDailyStats.__table__, OwnerDailyStats.__table__])
+    rollups.backfill(conn)
+
+
+def _add_last_outcome(conn: Connection) -> None:
+    column_type = TestCase.__table__.c.last_outcome.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE test_cases ADD COLUMN last_outcome {column_type}"))
+    latest = (
+        select(TestExecution.outcome)
+        .where(TestExecution.test_case_id == TestCase.id)
+        .order_by(TestExecution.id.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+    conn.execute(update(TestCase).values(last_outcome=latest))
+
+
+# version -> step that upgrades the schema from version - 1.
+# Version 1 is the initial schema and is created from the models directly.
+MIGRATIONS: dict[int, Callable[[Connection], None]] = {
+    2: _add_daily_rollups,
+    3: _add_last_outcome,
+}
+
+# Arbitrary key for the Postgres advisory lock that serializes concurrent bootstraps.
+_BOOTSTRAP_LOCK_KEY = 0x43464931
+
+logger = logging.getLogger("cfi.bootstrap")
+
+
+def _read_version(conn: Connection) -> int | None:
+    if not inspect(conn).has_table(SchemaVersion.__tablename__):
+        return None
+    return conn.scalar(select(func.max(SchemaVersion.version)))
+
+
+def current_version(eng: Engine) -> int | None:
+    """Schema version recorded in the database, or None if it was never bootstrapped."""
+    # Connection/auth errors propagate from connect(); only a missing
+    # schema_version table means "not bootstrapped".
+    with eng.connect() as conn:
+        try:
+            return conn.scalar(select(func.max(SchemaVersion.version)))
+        except DBAPIError:
+            conn.rollback()
+            if inspect(conn).has_table(SchemaVersion.__tablename__):
+                raise
+            return None
+
+
+def bootstrap(eng: Engine = engine) -> int:
+    """
+    One-time schema setup: creates the schema on an empty database, or applies
+    pending MIGRATIONS on an older one. Safe to re-run, including from several
+    containers at once. Returns the new version.
+    """
+    rollups.check_dialect(eng.dialect.name)
+    if current_version(eng) == SCHEMA_VERSION:
+        return SCHEMA_VERSION
+
+    with eng.begin() as conn:
+        # Serialize concurrent bootstraps; later ones wait here, then see the new version.
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _BOOTSTRAP_LOCK_KEY})
+        elif conn.dialect.name == "sqlite":
+            # take the database write lock before reading the version
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        version = _read_version(conn)
+        if version == SCHEMA_VERSION:
+            return SCHEMA_VERSION
+
+        if version is None and inspect(conn).has_table(TestExecution.__tablename__):
+            # Created by the old import-time create_all: that is schema version 1.
+            Base.metadata.create_all(bind=conn, tables=[SchemaVersion.__table__])
+            conn.execute(SchemaVersion.__table__.insert().values(version=1))
+            version = 1
+
+        if version is None:
+            Base.metadata.create_all(bind=conn)
+            conn.execute(SchemaVersion.__table__.insert().values(version=SCHEMA_VERSION))
+        else:
+            for v in range(version + 1, SCHEMA_VERSION + 1):
+                MIGRATIONS[v](conn)
+                conn.execute(SchemaVersion.__table__.insert().values(version=v))
+
+    logger.info("schema bootstrapped: %s -> %s", version, SCHEMA_VERSION)
+    return SCHEMA_VERSION
+
+
+def ensure_schema(eng: Engine = engine) -> None:
+    """Cheap startup check: a single query against schema_version when it exists."""
+    rollups.check_dialect(eng.dialect.name)
+    version = current_version(eng)
+    if version != SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {SCHEMA_VERSION}. "
+            "Run `python bootstrap.py` before starting the API."
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Create or migrate the database schema.")
+    parser.add_argument(
+        "--replica",
+        action="store_true",
+        help="Bootstrap DATABASE_READ_URL instead (local setups where it is a separate, writable database)",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(f"schema version {bootstrap(read_engine if args.replica else engine)}")
@@ -0,0 +1,5 @@
+# Lightweight shared settings, importable without pulling in heavy modules.
+
+# Rows per Arrow record batch / export chunk.
+DEFAULT_CHUNK_SIZE = 10_000
+MAX_CHUNK_SIZE = 100_000
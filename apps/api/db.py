@@ -1,20 +1,136 @@
+import logging
+import math
 import os
-from sqlalchemy import create_engine
+import time
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
+import metrics
+
 DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise RuntimeError("DATABASE_URL is not set")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+# Optional read replica. When unset, reads share the primary engine.
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+
+# Statements slower than this are logged and counted (milliseconds).
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+# After a client writes, its reads go to the primary for this long so it
+# doesn't see a replica that hasn't caught up yet (seconds).
+READ_YOUR_WRITES_SEC = float(os.getenv("READ_YOUR_WRITES_SEC", "5"))
+
+logger = logging.getLogger("cfi.sql")
+
+
+def _pool_kwargs(prefix: str) -> dict:
+    # e.g. DB_POOL_SIZE / DB_MAX_OVERFLOW, DB_READ_POOL_SIZE / DB_READ_MAX_OVERFLOW
+    kwargs = {}
+    if os.getenv(f"{prefix}_POOL_SIZE"):
+        kwargs["pool_size"] = int(os.environ[f"{prefix}_POOL_SIZE"])
+    if os.getenv(f"{prefix}_MAX_OVERFLOW"):
+        kwargs["max_overflow"] = int(os.environ[f"{prefix}_MAX_OVERFLOW"])
+    return kwargs
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+    slow = elapsed * 1000 >= SLOW_QUERY_MS
+    if slow:
+        logger.warning("slow query (%.1f ms): %s", elapsed * 1000, " ".join(statement.split())[:500])
+    metrics.record_statement(verb, elapsed, slow)
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute never fires for a failed statement; drop its start time.
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start"):
+        conn.info["query_start"].pop()
+
+
+def _make_engine(url: str, pool_prefix: str) -> Engine:
+    eng = create_engine(url, pool_pre_ping=True, **_pool_kwargs(pool_prefix))
+    event.listen(eng, "before_cursor_execute", _before_cursor_execute)
+    event.listen(eng, "after_cursor_execute", _after_cursor_execute)
+    event.listen(eng, "handle_error", _handle_error)
+    return eng
+
+
+engine = _make_engine(DATABASE_URL, "DB")
+read_engine = _make_engine(DATABASE_READ_URL, "DB_READ") if DATABASE_READ_URL else engine
+
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
+
+# Engines by role, for pool gauges.
+ENGINES = {"primary": engine, "replica": read_engine} if read_engine is not engine else {"primary": engine}
+
+
+def _reset_pools_after_fork() -> None:
+    # Preforked workers must not reuse connections opened by the parent.
+    for eng in ENGINES.values():
+        eng.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=_reset_pools_after_fork)
+
 
 class Base(DeclarativeBase):
     pass
 
-def get_db():
+
+# Write endpoints return the time of the write (epoch seconds) in this header
+# and cookie; clients send either back so any worker can route their reads.
+LAST_WRITE_HEADER = "x-last-write"
+LAST_WRITE_COOKIE = "cfi_last_write"
+
+
+def _wrote_recently(request: Request) -> bool:
+    value = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    try:
+        ts = float(value) if value else None
+    except ValueError:
+        return False
+    if ts is None:
+        return False
+    # small negative ages allow for clock skew between API hosts
+    return -1.0 <= time.time() - ts <= READ_YOUR_WRITES_SEC
+
+
+def mark_write(request: Request, response: Response) -> None:
+    """Stamp the response of a request that used the primary session."""
+    if read_engine is engine or not getattr(request.state, "db_write", False):
+        return
+    stamp = f"{time.time():.3f}"
+    response.headers[LAST_WRITE_HEADER] = stamp
+    response.set_cookie(LAST_WRITE_COOKIE, stamp, max_age=max(1, math.ceil(READ_YOUR_WRITES_SEC)))
+
+
+def get_db(request: Request):
+    """Primary session for endpoints that write; the response gets a last-write stamp."""
+    request.state.db_write = True
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def get_read_db(request: Request):
+    """Replica session for read-only endpoints, or the primary right after this client wrote."""
+    if read_engine is engine or _wrote_recently(request):
+        db = SessionLocal()
+    else:
+        db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
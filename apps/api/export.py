@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+import uuid
+from typing import Iterator
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from constants import DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE
+from db import ReadSessionLocal
+from models import PipelineRun, TestCase, TestExecution
+
+STATE_FILE = "_export_state.json"
+
+# Execution ids are allocated at flush but only become visible at commit, so a
+# slow ingest can commit ids below ones that were already exported. Incremental
+# exports remember unseen ids (gaps) this far below the watermark and pick them
+# up once they appear. Size it above the number of ids allocated while the
+# longest ingest transaction is open.
+DEFAULT_OVERLAP_IDS = 100_000
+
+# outcome and nodeid repeat heavily across rows, so keep them dictionary-encoded
+# both in Arrow and in the Parquet files.
+_dict_str = pa.dictionary(pa.int32(), pa.string())
+
+EXECUTION_SCHEMA = pa.schema([
+    ("execution_id", pa.int64()),
+    ("run_id", pa.int64()),
+    ("test_case_id", pa.int64()),
+    ("nodeid", _dict_str),
+    ("suite", pa.string()),
+    ("owner", pa.string()),
+    ("provider", pa.string()),
+    ("workflow", pa.string()),
+    ("branch", pa.string()),
+    ("commit_sha", pa.string()),
+    ("outcome", _dict_str),
+    ("duration_sec", pa.float64()),
+    ("failure_type", pa.string()),
+    ("error_hash", pa.string()),
+    ("reason_code", pa.string()),
+    ("classified_as", pa.string()),
+    ("created_at", pa.timestamp("us")),
+    # partition columns
+    ("date", pa.string()),
+    ("repo", pa.string()),
+])
+
+_COLUMNS = (
+    TestExecution.id,
+    TestExecution.run_id,
+    TestExecution.test_case_id,
+    TestCase.nodeid,
+    TestCase.suite,
+    TestCase.owner,
+    PipelineRun.provider,
+    PipelineRun.workflow,
+    PipelineRun.branch,
+    PipelineRun.commit_sha,
+    TestExecution.outcome,
+    TestExecution.duration_sec,
+    TestExecution.failure_type,
+    TestExecution.error_hash,
+    TestExecution.reason_code,
+    TestExecution.classified_as,
+    TestExecution.created_at,
+    PipelineRun.repo,
+)
+
+
+def iter_execution_batches(
+    db: Session,
+    after_id: int = 0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    until_id: int | None = None,
+) -> Iterator[pa.RecordBatch]:
+    """
+    Stream test_executions joined with test_cases and pipeline_runs as Arrow
+    record batches, ordered by execution id, for after_id < id <= until_id.
+    Uses keyset pagination on id so each chunk is a bounded index range scan.
+    """
+    if not 0 < chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+
+    last_id = after_id
+    while True:
+        stmt = (
+            select(*_COLUMNS)
+            .join(TestCase, TestExecution.test_case_id == TestCase.id)
+            .join(PipelineRun, TestExecution.run_id == PipelineRun.id)
+            .where(TestExecution.id > last_id)
+            .order_by(TestExecution.id)
+            .limit(chunk_size)
+        )
+        if until_id is not None:
+            stmt = stmt.where(TestExecution.id <= until_id)
+        rows = db.execute(stmt).all()
+        if not rows:
+            return
+
+        cols = list(zip(*rows))
+        created_at = cols[16]
+        data = list(cols[:17]) + [
+            [ts.strftime("%Y-%m-%d") for ts in created_at],
+            cols[17],
+        ]
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(col, type=f.type) for col, f in zip(data, EXECUTION_SCHEMA)],
+            schema=EXECUTION_SCHEMA,
+        )
+        last_id = rows[-1][0]
+        if len(rows) < chunk_size:
+            return
+
+
+def _read_state(out_dir: str) -> tuple[int, list[list[int]]]:
+    """Returns (last exported id, [lo, hi] id ranges below it not yet seen)."""
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return 0, []
+    with open(path) as f:
+        state = json.load(f)
+    return int(state.get("last_execution_id", 0)), state.get("pending_ranges", [])
+
+
+def _write_state(out_dir: str, last_id: int, pending: list[list[int]]) -> None:
+    path = os.path.join(out_dir, STATE_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"last_execution_id": last_id, "pending_ranges": pending}, f)
+    os.replace(tmp, path)
+
+
+def _subtract(ranges: list[list[int]], ids: list[int]) -> list[list[int]]:
+    """Remove sorted ids from inclusive [lo, hi] ranges."""
+    out: list[list[int]] = []
+    for lo, hi in ranges:
+        for i in ids:
+            if i < lo or i > hi:
+                continue
+            if i > lo:
+                out.append([lo, i - 1])
+            lo = i + 1
+        if lo <= hi:
+            out.append([lo, hi])
+    return out
+
+
+def export_parquet(
+    db: Session,
+    out_dir: str,
+    incremental: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    overlap_ids: int = DEFAULT_OVERLAP_IDS,
+) -> tuple[int, int]:
+    """
+    Write execution history to a Parquet dataset under out_dir, partitioned
+    as date=YYYY-MM-DD/repo=<repo>/.
+
+    With incremental=True only rows after the last exported id are written,
+    as new files next to the existing ones, plus any rows that committed late
+    into gaps within overlap_ids of the last watermark. Returns
+    (rows_written, last_id).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    after_id, pending = _read_state(out_dir) if incremental else (0, [])
+
+    written = 0
+    last_id = after_id
+    # ids <= after_id that turned up now, and gaps among ids > after_id
+    late_ids: list[int] = []
+    new_gaps: list[list[int]] = []
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        nonlocal written, last_id
+        for lo, hi in pending:
+            for batch in iter_execution_batches(db, after_id=lo - 1, until_id=hi, chunk_size=chunk_size):
+                written += batch.num_rows
+                late_ids.extend(batch.column(0).to_pylist())
+                yield batch
+        for batch in iter_execution_batches(db, after_id=after_id, chunk_size=chunk_size):
+            written += batch.num_rows
+            for i in batch.column(0).to_pylist():
+                if i > last_id + 1:
+                    new_gaps.append([last_id + 1, i - 1])
+                last_id = i
+            yield batch
+
+    parquet = ds.ParquetFileFormat()
+    ds.write_dataset(
+        ds.Scanner.from_batches(batches(), schema=EXECUTION_SCHEMA),
+        out_dir,
+        format=parquet,
+        file_options=parquet.make_write_options(use_dictionary=["nodeid", "outcome"]),
+        partitioning=ds.partitioning(
+            pa.schema([("date", pa.string()), ("repo", pa.string())]), flavor="hive"
+        ),
+        # Unique per export so incremental runs add files instead of replacing them.
+        basename_template=f"part-{after_id}-{uuid.uuid4().hex[:8]}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore" if incremental else "delete_matching",
+    )
+
+    # Keep only gaps still inside the overlap window; older ones are given up on
+    # (rolled-back ingests leave permanent gaps).
+    floor = last_id - overlap_ids
+    remaining = _subtract(pending, sorted(late_ids)) + new_gaps
+    remaining = [[max(lo, floor + 1), hi] for lo, hi in remaining if hi > floor]
+    _write_state(out_dir, last_id, remaining)
+    return written, last_id
+
+
+def stream_arrow_ipc(after_id: int = 0, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Yield an Arrow IPC stream of execution history, one chunk per batch."""
+    buf = io.BytesIO()
+    db = ReadSessionLocal()
+    try:
+        with pa.ipc.new_stream(buf, EXECUTION_SCHEMA) as writer:
+            for batch in iter_execution_batches(db, after_id=after_id, chunk_size=chunk_size):
+                writer.write_batch(batch)
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        # end-of-stream marker written on close
+        yield buf.getvalue()
+    finally:
+        db.close()
+
+
+def _chunk_size_arg(value: str) -> int:
+    size = int(value)
+    if not 0 < size <= MAX_CHUNK_SIZE:
+        raise argparse.ArgumentTypeError(f"must be between 1 and {MAX_CHUNK_SIZE}")
+    return size
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Export test execution history to partitioned Parquet.")
+    parser.add_argument("out_dir", help="Destination directory for the Parquet dataset")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only export executions newer than the last export in out_dir",
+    )
+    parser.add_argument("--chunk-size", type=_chunk_size_arg, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--overlap-ids",
+        type=int,
+        default=DEFAULT_OVERLAP_IDS,
+        help="How far below the last exported id to keep watching for late-committed rows",
+    )
+    args = parser.parse_args(argv)
+
+    db = ReadSessionLocal()
+    try:
+        written, last_id = export_parquet(
+            db,
+            args.out_dir,
+            incremental=args.incremental,
+            chunk_size=args.chunk_size,
+            overlap_ids=args.overlap_ids,
+        )
+    finally:
+        db.close()
+    print(f"exported {written} executions to {args.out_dir} (last id {last_id})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, HTTPException
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import select
 
-from db import Base, engine, get_db
-from models import PipelineRun, TestCase, TestExecution
+from constants import DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE
+from db import ENGINES, get_db, get_read_db, mark_write
+from models import OwnerDailyStats, PipelineRun, SuiteDailyStats, TestCase, TestExecution
 from schemas import (
     RunCreate, RunOut,
     TestCaseOut, TestExecutionOut,
@@ -12,12 +19,73 @@ from schemas import (
 from junit_parser import parse_junit_xml
 from sqlalchemy import func
 from collections import defaultdict
+import metrics
+import rollups
+from bootstrap import ensure_schema
+
+# Heavy analytics modules (pyarrow) are imported on first use. With a
+# preforking server (e.g. gunicorn --preload) set PRELOAD_ANALYTICS=1 to load
+# them once in the parent so workers share the pages instead.
+if os.getenv("PRELOAD_ANALYTICS", "").strip().lower() in {"1", "true", "yes"}:
+    import export  # noqa: F401
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Schema creation/migration happens once via `python bootstrap.py`;
+    # workers only verify the version.
+    ensure_schema()
+    yield
+
+
+app = FastAPI(title="CI Failure Intelligence", lifespan=lifespan)
+
+# Send this request header to get the per-stage breakdown back as Server-Timing.
+DEBUG_TIMING_HEADER = "x-debug-timing"
+
+
+def _record_request(request: Request, status: str, elapsed: float, stats: metrics.RequestStats) -> None:
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    metrics.http_requests.inc(request.method, path, status)
+    metrics.http_duration.observe(elapsed, request.method, path)
+    metrics.http_db_statements.inc(request.method, path, amount=stats.sql_count)
+    metrics.http_db_seconds.inc(request.method, path, amount=stats.sql_seconds)
+
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    stats = metrics.start_request()
+    t0 = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        # Unhandled errors become a 500; count them before re-raising.
+        _record_request(request, "500", time.perf_counter() - t0, stats)
+        raise
+    elapsed = time.perf_counter() - t0
+    _record_request(request, str(response.status_code), elapsed, stats)
 
-app = FastAPI(title="CI Failure Intelligence")
+    if request.headers.get(DEBUG_TIMING_HEADER):
+        response.headers["Server-Timing"] = metrics.server_timing(stats) + f", total;dur={elapsed * 1000:.2f}"
+    return response
+
+
+@app.middleware("http")
+async def read_your_writes(request: Request, call_next):
+    # Stamped after the handler returns, i.e. after the write committed.
+    response = await call_next(request)
+    mark_write(request, response)
+    return response
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(
+        metrics.render_prometheus(ENGINES),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
 
-# DEV convenience: create tables automatically.
-# In real deployments, replace this with Alembic migrations.
-Base.metadata.create_all(bind=engine)
 
 @app.get("/health")
 def health():
@@ -32,7 +100,7 @@ def create_run(payload: RunCreate, db: Session = Depends(get_db)):
     return run
 
 @app.get("/runs", response_model=list[RunOut])
-def list_runs(db: Session = Depends(get_db), limit: int = 25):
+def list_runs(db: Session = Depends(get_read_db), limit: int = 25):
     stmt = select(PipelineRun).order_by(PipelineRun.started_at.desc()).limit(limit)
     return list(db.scalars(stmt).all())
 
@@ -101,51 +169,74 @@ async def ingest_junit(
     if not file.filename:
         raise HTTPException(status_code=400, detail="Missing file")
 
-    xml_bytes = await file.read()
+    with metrics.stage("read"):
+        xml_bytes = await file.read()
     if not xml_bytes:
         raise HTTPException(status_code=400, detail="Empty file")
 
     # Resolve run
-    if run_id is not None:
-        run = db.get(PipelineRun, run_id)
-        if not run:
-            raise HTTPException(status_code=404, detail=f"run_id {run_id} not found")
-    else:
-        run = create_run_if_needed(
-            db=db,
-            provider=provider,
-            workflow=workflow,
-            repo=repo,
-            branch=branch,
-            commit_sha=commit_sha,
-            run_external_id=run_external_id,
-            status=status,
-        )
+    with metrics.stage("resolve_run"):
+        if run_id is not None:
+            run = db.get(PipelineRun, run_id)
+            if not run:
+                raise HTTPException(status_code=404, detail=f"run_id {run_id} not found")
+        else:
+            run = create_run_if_needed(
+                db=db,
+                provider=provider,
+                workflow=workflow,
+                repo=repo,
+                branch=branch,
+                commit_sha=commit_sha,
+                run_external_id=run_external_id,
+                status=status,
+            )
 
     # Parse JUnit
-    try:
-        parsed = parse_junit_xml(xml_bytes)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Invalid JUnit XML: {e}")
+    with metrics.stage("parse"):
+        try:
+            parsed = parse_junit_xml(xml_bytes)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JUnit XML: {e}")
 
     # Persist: upsert test cases, insert executions
     ingested = 0
-    for r in parsed:
-        tc = upsert_test_case(db, nodeid=r.nodeid, suite=r.suite, file_path=r.file_path)
-
-        ex = TestExecution(
-            run_id=run.id,
-            test_case_id=tc.id,
-            outcome=r.outcome,
-            duration_sec=r.duration_sec,
-            failure_type=r.failure_type,
-            error_hash=r.error_hash,
-            error_message=r.error_message,
+    with metrics.stage("persist"):
+        test_cases = [
+            upsert_test_case(db, nodeid=r.nodeid, suite=r.suite, file_path=r.file_path)
+            for r in parsed
+        ]
+        # captured before last_outcome is advanced below
+        prev_outcomes = {tc.id: tc.last_outcome for tc in test_cases if tc.last_outcome}
+
+        for r, tc in zip(parsed, test_cases):
+            ex = TestExecution(
+                run_id=run.id,
+                test_case_id=tc.id,
+                outcome=r.outcome,
+                duration_sec=r.duration_sec,
+                failure_type=r.failure_type,
+                error_hash=r.error_hash,
+                error_message=r.error_message,
+            )
+            db.add(ex)
+            tc.last_outcome = r.outcome
+            ingested += 1
+
+        # Sessions don't autoflush; send the execution INSERTs here so they are
+        # timed as part of persist rather than commit.
+        db.flush()
+
+    with metrics.stage("rollups"):
+        rollups.apply_ingest(
+            db,
+            day=datetime.utcnow().date(),
+            results=[(tc, r.outcome) for r, tc in zip(parsed, test_cases)],
+            prev_outcomes=prev_outcomes,
         )
-        db.add(ex)
-        ingested += 1
 
-    db.commit()
+    with metrics.stage("commit"):
+        db.commit()
     return IngestResponse(run_id=run.id, tests_ingested=ingested)
 
 
@@ -153,14 +244,14 @@ async def ingest_junit(
 # Listing endpoints (Day 3 verification)
 # -------------------------
 @app.get("/tests", response_model=list[TestCaseOut])
-def list_tests(db: Session = Depends(get_db), limit: int = 50):
+def list_tests(db: Session = Depends(get_read_db), limit: int = 50):
     stmt = select(TestCase).order_by(TestCase.created_at.desc()).limit(limit)
     return list(db.scalars(stmt).all())
 
 
 @app.get("/executions", response_model=list[TestExecutionOut])
 def list_executions(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     run_id: int | None = None,
     test_case_id: int | None = None,
     limit: int = 100,
@@ -175,7 +266,7 @@ def list_executions(
 
 @app.get("/flakes")
 def list_flaky_tests(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     window: int = 20,
     min_executions: int = 5,
     limit: int = 20,
@@ -222,3 +313,50 @@ def list_flaky_tests(
 
     results.sort(key=lambda r: r["flake_score"], reverse=True)
     return results[:limit]
+
+
+# -------------------------
+# Suite / owner health (served from the daily rollups)
+# -------------------------
+@app.get("/stats/suites")
+def suite_stats(
+    db: Session = Depends(get_read_db),
+    days: int = Query(default=7, ge=1, le=366),
+    limit: int = Query(default=50, ge=1, le=500),
+):
+    """
+    Failure and flake rates per suite over the last `days` days, highest failure rate first.
+    """
+    return rollups.health(db, SuiteDailyStats, "suite", days=days, limit=limit)
+
+
+@app.get("/stats/owners")
+def owner_stats(
+    db: Session = Depends(get_read_db),
+    days: int = Query(default=7, ge=1, le=366),
+    limit: int = Query(default=50, ge=1, le=500),
+):
+    """
+    Failure and flake rates per owner over the last `days` days, highest failure rate first.
+    """
+    return rollups.health(db, OwnerDailyStats, "owner", days=days, limit=limit)
+
+
+# -------------------------
+# Analytics export
+# -------------------------
+@app.get("/export/executions.arrow")
+def export_executions_arrow(
+    after_id: int = 0,
+    chunk_size: int = Query(default=DEFAULT_CHUNK_SIZE, gt=0, le=MAX_CHUNK_SIZE),
+):
+    """
+    Streams execution history (joined with test case and run metadata) as an
+    Arrow IPC stream. Pass after_id to fetch only newer executions.
+    """
+    import export
+
+    return StreamingResponse(
+        export.stream_arrow_ipc(after_id=after_id, chunk_size=chunk_size),
+        media_type="application/vnd.apache.arrow.stream",
+    )
@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator
+
+# Default latency buckets (seconds), roughly Prometheus client defaults.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+@dataclass
+class RequestStats:
+    """Per-request accounting: pipeline stage timings and SQL activity."""
+    sql_count: int = 0
+    sql_seconds: float = 0.0
+    # stage name -> (seconds, sql statements issued during the stage)
+    stages: dict[str, tuple[float, int]] = field(default_factory=dict)
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("cfi_request_stats", default=None)
+
+
+def start_request() -> RequestStats:
+    stats = RequestStats()
+    _current.set(stats)
+    return stats
+
+
+def current_request() -> RequestStats | None:
+    return _current.get()
+
+
+class _Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {_fmt_num(value)}")
+        return lines
+
+
+class _Histogram:
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # label values -> [per-bucket counts..., +Inf count, sum]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            row = self._values.get(label_values)
+            if row is None:
+                row = [0.0] * (len(self.buckets) + 2)
+                self._values[label_values] = row
+            row[bisect_left(self.buckets, value)] += 1
+            row[-1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, row in sorted(self._values.items()):
+                cumulative = 0.0
+                for bound, count in zip(self.buckets + (float("inf"),), row):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _fmt_num(bound)
+                    lines.append(
+                        f"{self.name}_bucket{_fmt_labels(self.labels + ('le',), key + (le,))} {_fmt_num(cumulative)}"
+                    )
+                lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {_fmt_num(row[-1])}")
+                lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {_fmt_num(cumulative)}")
+        return lines
+
+
+def _fmt_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for n, v in zip(names, values):
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{n}="{v}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _fmt_num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# -------------------------
+# Registry
+# -------------------------
+http_requests = _Counter(
+    "cfi_http_requests_total", "HTTP requests handled.", ("method", "path", "status")
+)
+http_duration = _Histogram(
+    "cfi_http_request_duration_seconds", "HTTP request latency.", ("method", "path")
+)
+http_db_statements = _Counter(
+    "cfi_http_db_statements_total", "SQL statements issued while serving requests.", ("method", "path")
+)
+http_db_seconds = _Counter(
+    "cfi_http_db_seconds_total", "Time spent in SQL statements while serving requests.", ("method", "path")
+)
+ingest_stage_duration = _Histogram(
+    "cfi_ingest_stage_duration_seconds", "Time spent in each ingest pipeline stage.", ("stage",)
+)
+db_statement_duration = _Histogram(
+    "cfi_db_statement_duration_seconds", "SQL statement execution time.", ("verb",)
+)
+db_slow_statements = _Counter(
+    "cfi_db_slow_statements_total", "SQL statements slower than the slow-query threshold.", ("verb",)
+)
+
+_REGISTRY = (
+    http_requests,
+    http_duration,
+    http_db_statements,
+    http_db_seconds,
+    ingest_stage_duration,
+    db_statement_duration,
+    db_slow_statements,
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time one stage of the ingest pipeline. The duration goes to the global
+    histogram and, when inside a request, to that request's breakdown.
+    """
+    stats = _current.get()
+    sql_before = stats.sql_count if stats else 0
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        ingest_stage_duration.observe(elapsed, name)
+        if stats is not None:
+            prev_sec, prev_sql = stats.stages.get(name, (0.0, 0))
+            stats.stages[name] = (prev_sec + elapsed, prev_sql + stats.sql_count - sql_before)
+
+
+def record_statement(verb: str, elapsed: float, slow: bool) -> None:
+    db_statement_duration.observe(elapsed, verb)
+    if slow:
+        db_slow_statements.inc(verb)
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_count += 1
+        stats.sql_seconds += elapsed
+
+
+def server_timing(stats: RequestStats) -> str:
+    """Format a request's breakdown as a Server-Timing header value."""
+    parts = [
+        f'{name};dur={sec * 1000:.2f};desc="{sql} sql"'
+        for name, (sec, sql) in stats.stages.items()
+    ]
+    parts.append(f'db;dur={stats.sql_seconds * 1000:.2f};desc="{stats.sql_count} sql"')
+    return ", ".join(parts)
+
+
+def _pool_gauges(engines: dict) -> list[str]:
+    gauges = (
+        ("cfi_db_pool_size", "Configured connection pool size.", "size"),
+        ("cfi_db_pool_checked_out", "Connections currently checked out.", "checkedout"),
+        ("cfi_db_pool_checked_in", "Idle connections held by the pool.", "checkedin"),
+        ("cfi_db_pool_overflow", "Connections opened beyond pool_size.", "overflow"),
+    )
+    lines: list[str] = []
+    for name, help_text, attr in gauges:
+        samples = []
+        for role, engine in engines.items():
+            # Only QueuePool-style pools expose these as methods; StaticPool lacks
+            # them and SingletonThreadPool has `size` as a plain int.
+            fn = getattr(engine.pool, attr, None)
+            if not callable(fn):
+                continue
+            value = fn()
+            if attr == "overflow":
+                # QueuePool reports unused pool slots as negative overflow.
+                value = max(0, value)
+            samples.append(f"{name}{_fmt_labels(('role',), (role,))} {_fmt_num(value)}")
+        if samples:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", *samples]
+    return lines
+
+
+def render_prometheus(engines: dict) -> str:
+    """
+    Render all metrics; engines maps a role label ("primary", "replica") to its
+    engine. Values are per process, so every sample carries this worker's pid.
+    """
+    lines: list[str] = []
+    for metric in _REGISTRY:
+        lines += metric.render()
+    lines += _pool_gauges(engines)
+    return "\n".join(_with_pid(line) for line in lines) + "\n"
+
+
+def _with_pid(line: str) -> str:
+    if line.startswith("#"):
+        return line
+    name, value = line.rsplit(" ", 1)
+    pid = f'pid="{os.getpid()}"'
+    if name.endswith("}"):
+        return f"{name[:-1]},{pid}}} {value}"
+    return f"{name}{{{pid}}} {value}"
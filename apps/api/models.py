@@ -1,8 +1,8 @@
 from __future__ import annotations
 
-from datetime import datetime
+from datetime import date, datetime
 from sqlalchemy import (
-    String, Integer, DateTime, Float, ForeignKey, Text, UniqueConstraint, Index
+    String, Integer, Date, DateTime, Float, ForeignKey, Text, UniqueConstraint, Index
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -41,6 +41,8 @@ class TestCase(Base):
     suite: Mapped[str | None] = mapped_column(String(128))
     file_path: Mapped[str | None] = mapped_column(String(256))
     owner: Mapped[str | None] = mapped_column(String(128))  # optional: team/owner tag
+    # outcome of the most recent execution, kept current at ingest
+    last_outcome: Mapped[str | None] = mapped_column(String(16))
 
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
 
@@ -83,3 +85,46 @@ class TestExecution(Base):
         Index("idx_exec_run_test", "run_id", "test_case_id"),
         Index("idx_exec_test_created", "test_case_id", "created_at"),
     )
+
+
+class DailyOutcomeCounts:
+    """Per-day outcome counters shared by the rollup tables, maintained at ingest."""
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    executions: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    passed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    failed: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    errored: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    skipped: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    # Executions that have a previous execution of the same test, and how many
+    # of those changed outcome. Same signal as the /flakes score.
+    compared: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    outcome_changes: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+class SuiteDailyStats(DailyOutcomeCounts, Base):
+    __tablename__ = "suite_daily_stats"
+
+    suite: Mapped[str] = mapped_column(String(128), primary_key=True)
+
+    __table_args__ = (
+        Index("idx_suite_daily_day", "day"),
+    )
+
+
+class OwnerDailyStats(DailyOutcomeCounts, Base):
+    __tablename__ = "owner_daily_stats"
+
+    owner: Mapped[str] = mapped_column(String(128), primary_key=True)
+
+    __table_args__ = (
+        Index("idx_owner_daily_day", "day"),
+    )
+
+
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    # One row per applied version; the highest is the current schema.
+    version: Mapped[int] = mapped_column(Integer, primary_key=True)
+    applied_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Float, case, cast, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from models import OwnerDailyStats, SuiteDailyStats, TestCase, TestExecution
+
+COUNTER_COLUMNS = (
+    "executions", "passed", "failed", "errored", "skipped", "compared", "outcome_changes",
+)
+
+# outcome -> counter column
+_OUTCOME_COLUMN = {"passed": "passed", "failed": "failed", "error": "errored", "skipped": "skipped"}
+
+
+# Rollups are incremented with INSERT ... ON CONFLICT DO UPDATE.
+_UPSERT_INSERT = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def check_dialect(dialect: str) -> None:
+    if dialect not in _UPSERT_INSERT:
+        raise RuntimeError(
+            f"Rollups need ON CONFLICT upserts; database dialect {dialect!r} is not supported "
+            f"(supported: {', '.join(sorted(_UPSERT_INSERT))})."
+        )
+
+
+def _add(counts: dict[str, Counter], key: str | None, outcome: str, prev: str | None) -> None:
+    if not key:
+        return
+    c = counts.setdefault(key, Counter())
+    c["executions"] += 1
+    if outcome in _OUTCOME_COLUMN:
+        c[_OUTCOME_COLUMN[outcome]] += 1
+    if prev is not None:
+        c["compared"] += 1
+        c["outcome_changes"] += int(outcome != prev)
+
+
+def _upsert(db: Session | Connection, model, key_column: str, day: date, counts: dict[str, Counter]) -> None:
+    if not counts:
+        return
+    dialect = db.get_bind().dialect.name if isinstance(db, Session) else db.dialect.name
+    check_dialect(dialect)
+    # Sorted so concurrent ingests lock rollup rows in the same order (no deadlocks).
+    stmt = _UPSERT_INSERT[dialect](model).values([
+        {key_column: key, "day": day, **{col: c[col] for col in COUNTER_COLUMNS}}
+        for key, c in sorted(counts.items())
+    ])
+    # Increment in the database so concurrent ingests don't overwrite each other.
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key_column, "day"],
+        set_={col: getattr(model, col) + getattr(stmt.excluded, col) for col in COUNTER_COLUMNS},
+    )
+    db.execute(stmt)
+
+
+def apply_ingest(
+    db: Session,
+    day: date,
+    results: list[tuple[TestCase, str]],
+    prev_outcomes: dict[int, str],
+) -> None:
+    """
+    Fold one ingest batch of (test case, outcome) pairs into the per-day suite
+    and owner rollups. prev_outcomes maps test case id to its last outcome
+    before this batch (TestCase.last_outcome).
+    """
+    prev = dict(prev_outcomes)
+    by_suite: dict[str, Counter] = {}
+    by_owner: dict[str, Counter] = {}
+    for tc, outcome in results:
+        p = prev.get(tc.id)
+        _add(by_suite, tc.suite, outcome, p)
+        _add(by_owner, tc.owner, outcome, p)
+        # a test repeated within one report compares against its earlier entry
+        prev[tc.id] = outcome
+
+    _upsert(db, SuiteDailyStats, "suite", day, by_suite)
+    _upsert(db, OwnerDailyStats, "owner", day, by_owner)
+
+
+def health(db: Session, model, key_column: str, days: int, limit: int) -> list[dict]:
+    """
+    Failure and flake rates per suite/owner over the last `days` days, highest
+    failure rate first. Reads only the rollup rows in the window, so cost
+    doesn't grow with history.
+    """
+    # days are UTC, matching TestExecution.created_at
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+    key = getattr(model, key_column)
+    sums = [func.sum(getattr(model, col)).label(col) for col in COUNTER_COLUMNS]
+    failure_rate = cast(func.sum(model.failed + model.errored), Float) / func.sum(model.executions)
+    stmt = (
+        select(key, *sums)
+        .where(model.day >= since)
+        .group_by(key)
+        .order_by(failure_rate.desc(), key)
+        .limit(limit)
+    )
+
+    results = []
+    for row in db.execute(stmt):
+        m = row._mapping
+        results.append(
+            {
+                key_column: m[key_column],
+                "executions": m["executions"],
+                "failed": m["failed"],
+                "errored": m["errored"],
+                "skipped": m["skipped"],
+                "failure_rate": round((m["failed"] + m["errored"]) / m["executions"], 3) if m["executions"] else 0.0,
+                "flake_rate": round(m["outcome_changes"] / m["compared"], 3) if m["compared"] else 0.0,
+            }
+        )
+    return results
+
+
+def backfill(conn: Connection) -> None:
+    """
+    Fill both (empty) rollup tables from test_executions, one INSERT ... SELECT
+    per table. Used by the schema migration that introduces them.
+    """
+    prev = func.lag(TestExecution.outcome).over(
+        partition_by=TestExecution.test_case_id, order_by=TestExecution.id
+    )
+    history = (
+        select(
+            TestCase.suite,
+            TestCase.owner,
+            func.date(TestExecution.created_at).label("day"),
+            TestExecution.outcome,
+            prev.label("prev_outcome"),
+        )
+        .join(TestCase, TestExecution.test_case_id == TestCase.id)
+        .subquery()
+    )
+    sums = [
+        func.count().label("executions"),
+        *[
+            func.sum(case((history.c.outcome == outcome, 1), else_=0)).label(col)
+            for outcome, col in _OUTCOME_COLUMN.items()
+        ],
+        func.sum(case((history.c.prev_outcome.is_not(None), 1), else_=0)).label("compared"),
+        func.sum(
+            case((history.c.prev_outcome.is_not(None) & (history.c.prev_outcome != history.c.outcome), 1), else_=0)
+        ).label("outcome_changes"),
+    ]
+    for model, key_column in ((SuiteDailyStats, "suite"), (OwnerDailyStats, "owner")):
+        key = history.c[key_column]
+        stmt = select(key, history.c.day, *sums).where(key.is_not(None)).group_by(key, history.c.day)
+        conn.execute(
+            insert(model).from_select(
+                [key_column, "day", "executions", *_OUTCOME_COLUMN.values(), "compared", "outcome_changes"],
+                stmt,
+            )
+        )
@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+
+# The API modules import flat (`from db import ...`) and need DATABASE_URL at import time.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault(
+    "DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="cfi-tests-"), "test.db")
+)
@@ -0,0 +1,81 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+
+import pyarrow.dataset as ds
+
+import export
+from db import Base, SessionLocal, engine
+import models
+
+
+@pytest.fixture
+def db():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def add_executions(db):
+    run = models.PipelineRun(repo="org/repo")
+    tc = models.TestCase(nodeid="tests.test_api::test_login")
+    db.add_all([run, tc])
+    db.commit()
+
+    def add(*ids):
+        for i in ids:
+            db.add(models.TestExecution(id=i, run_id=run.id, test_case_id=tc.id, outcome="passed"))
+        db.commit()
+
+    return add
+
+
+def exported_ids(out_dir) -> list[int]:
+    table = ds.dataset(str(out_dir), format="parquet", partitioning="hive").to_table()
+    return sorted(table.column("execution_id").to_pylist())
+
+
+def test_subtract_splits_ranges():
+    assert export._subtract([[3, 9]], [3, 5, 9]) == [[4, 4], [6, 8]]
+    assert export._subtract([[1, 2], [6, 6]], [6]) == [[1, 2]]
+    assert export._subtract([[4, 5]], []) == [[4, 5]]
+
+
+def test_incremental_export_picks_up_late_commits(db, add_executions, tmp_path):
+    add_executions(1, 2, 5)
+    assert export.export_parquet(db, tmp_path, incremental=True) == (3, 5)
+    assert export._read_state(tmp_path) == (5, [[3, 4]])
+
+    # 4 commits late into the gap, 6 is new
+    add_executions(4, 6)
+    assert export.export_parquet(db, tmp_path, incremental=True, chunk_size=1) == (2, 6)
+    assert export._read_state(tmp_path) == (6, [[3, 3]])
+
+    add_executions(3)
+    assert export.export_parquet(db, tmp_path, incremental=True) == (1, 6)
+    assert export._read_state(tmp_path) == (6, [])
+
+    assert exported_ids(tmp_path) == [1, 2, 3, 4, 5, 6]
+
+
+def test_gaps_below_overlap_window_are_dropped(db, add_executions, tmp_path):
+    add_executions(1, 4, 10)
+    export.export_parquet(db, tmp_path, incremental=True, overlap_ids=5)
+    # gap 2-3 is more than 5 ids below 10; gap 5-9 is clipped to 6-9
+    assert export._read_state(tmp_path) == (10, [[6, 9]])
+
+    add_executions(2, 7)
+    assert export.export_parquet(db, tmp_path, incremental=True, overlap_ids=5) == (1, 10)
+    assert exported_ids(tmp_path) == [1, 4, 7, 10]
+    assert export._read_state(tmp_path) == (10, [[6, 6], [8, 9]])
+
+
+def test_cli_rejects_bad_chunk_size(capsys):
+    with pytest.raises(SystemExit):
+        export.main(["out", "--chunk-size", "0"])
+    assert "--chunk-size: must be between 1" in capsys.readouterr().err
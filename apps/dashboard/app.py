@@ -112,6 +112,33 @@ else:
         "Higher score means more unstable."
     )
 
+# ---- Suite / team health ----
+st.subheader("Suite & Team Health (last 7 days)")
+
+suites_df = safe_df(fetch_json("/stats/suites?days=7"))
+owners_df = safe_df(fetch_json("/stats/owners?days=7"))
+
+left, right = st.columns(2)
+
+with left:
+    st.markdown("**By suite**")
+    if suites_df.empty:
+        st.info("No suite data yet.")
+    else:
+        st.dataframe(suites_df, use_container_width=True, height=300)
+
+with right:
+    st.markdown("**By owner**")
+    if owners_df.empty:
+        st.info("No owner tags yet. Set `owner` on test cases to see team rollups.")
+    else:
+        st.dataframe(owners_df, use_container_width=True, height=300)
+
+st.caption(
+    "Failure rate = (failed + error) / executions. "
+    "Flake rate = outcome changes / executions with a previous result."
+)
+
 # ---- Drilldown: executions by run ----
 st.subheader("Drilldown: Executions by Run")
 if runs_df.empty: